@@ -1,76 +1,123 @@
 import pandas as pd
 
+# Only these columns of the training data are used by the report
+REPORT_COLUMNS = [
+    'url', 'link_text', 'label_simple', 'label_contextual',
+    'has_pagination', 'is_main_list_pagination', 'is_nested_pagination',
+    'has_show_param', 'show_param_value', 'is_view_toggle',
+    'in_faceted_search', 'potential_issues_count'
+]
+
+BOOL_COLUMNS = [
+    'label_simple', 'label_contextual', 'has_pagination', 'is_main_list_pagination',
+    'is_nested_pagination', 'has_show_param', 'is_view_toggle', 'in_faceted_search'
+]
+
+# Rows read at a time, which bounds memory regardless of file size
+CHUNK_SIZE = 100_000
+
+SAMPLE_SIZE = 3
+
 def analyze_label_differences():
     """Analyze where simple and contextual labels differ"""
     
-    # Load the data
-    df = pd.read_csv('results/training_data_v2.csv')
-    
-    print(f"Total links: {len(df)}")
-    print(f"Simple 'good' links: {df['label_simple'].sum()}")
-    print(f"Contextual 'good' links: {df['label_contextual'].sum()}")
-    print(f"Difference: {df['label_contextual'].sum() - df['label_simple'].sum()}")
+    # Stream the data, keeping running totals plus only the rows that get printed
+    total_links = simple_good_count = contextual_good_count = 0
+    different_chunks = []
+    pagination_count = main_list_pagination_count = nested_pagination_count = 0
+    pagination_samples = []
+    show_count = view_toggle_count = 0
+    show_samples = []
+
+    reader = pd.read_csv(
+        'results/training_data_v2.csv',
+        usecols=REPORT_COLUMNS,
+        # Plain numpy bools make the masks and sums below single C-level passes
+        dtype=dict.fromkeys(BOOL_COLUMNS, bool),
+        chunksize=CHUNK_SIZE
+    )
+    for chunk in reader:
+        total_links += len(chunk)
+        simple_good_count += chunk['label_simple'].sum()
+        contextual_good_count += chunk['label_contextual'].sum()
+        different_chunks.append(chunk[chunk['label_simple'] != chunk['label_contextual']])
+
+        pagination_links = chunk[chunk['has_pagination']]
+        pagination_count += len(pagination_links)
+        main_list_pagination_count += pagination_links['is_main_list_pagination'].sum()
+        nested_pagination_count += pagination_links['is_nested_pagination'].sum()
+        pagination_samples.append(pagination_links.head(SAMPLE_SIZE))
+
+        show_links = chunk[chunk['has_show_param']]
+        show_count += len(show_links)
+        view_toggle_count += show_links['is_view_toggle'].sum()
+        show_samples.append(show_links.head(SAMPLE_SIZE))
+
+    print(f"Total links: {total_links}")
+    print(f"Simple 'good' links: {simple_good_count}")
+    print(f"Contextual 'good' links: {contextual_good_count}")
+    print(f"Difference: {contextual_good_count - simple_good_count}")
     
     # Find where labels differ
-    different_labels = df[df['label_simple'] != df['label_contextual']]
+    different_labels = pd.concat(different_chunks)
     print(f"\nLinks where labels differ: {len(different_labels)}")
     
     if len(different_labels) > 0:
         print("\n=== Cases where Contextual says GOOD but Simple says BAD ===")
-        contextual_good = different_labels[
-            (different_labels['label_contextual'] == True) & 
-            (different_labels['label_simple'] == False)
-        ]
+        # Labels differ on these rows, so one label being True implies the other is False
+        contextual_good = different_labels[different_labels['label_contextual']]
         
-        for idx, row in contextual_good.iterrows():
-            print(f"\nURL: {row['url']}")
-            print(f"Text: '{row['link_text']}'")
-            print(f"Has pagination: {row['has_pagination']}")
-            print(f"Is main list pagination: {row['is_main_list_pagination']}")
-            print(f"Has show param: {row['has_show_param']}")
-            print(f"Is view toggle: {row['is_view_toggle']}")
-            print(f"In faceted search: {row['in_faceted_search']}")
+        contextual_good_cols = ['url', 'link_text', 'has_pagination', 'is_main_list_pagination',
+                                'has_show_param', 'is_view_toggle', 'in_faceted_search']
+        for (url, link_text, has_pagination, is_main_list_pagination,
+             has_show_param, is_view_toggle, in_faceted_search) in contextual_good[contextual_good_cols].to_numpy():
+            print(f"\nURL: {url}")
+            print(f"Text: '{link_text}'")
+            print(f"Has pagination: {has_pagination}")
+            print(f"Is main list pagination: {is_main_list_pagination}")
+            print(f"Has show param: {has_show_param}")
+            print(f"Is view toggle: {is_view_toggle}")
+            print(f"In faceted search: {in_faceted_search}")
             
         print(f"\nTotal contextual-good/simple-bad: {len(contextual_good)}")
         
         print("\n=== Cases where Simple says GOOD but Contextual says BAD ===")
-        simple_good = different_labels[
-            (different_labels['label_simple'] == True) & 
-            (different_labels['label_contextual'] == False)
-        ]
+        simple_good = different_labels[different_labels['label_simple']]
         
-        for idx, row in simple_good.iterrows():
-            print(f"\nURL: {row['url']}")
-            print(f"Text: '{row['link_text']}'")
-            print(f"Has pagination: {row['has_pagination']}")
-            print(f"Has show param: {row['has_show_param']}")
-            print(f"Potential issues: {row['potential_issues_count']}")
+        simple_good_cols = ['url', 'link_text', 'has_pagination', 'has_show_param', 'potential_issues_count']
+        for url, link_text, has_pagination, has_show_param, potential_issues_count in simple_good[simple_good_cols].to_numpy():
+            print(f"\nURL: {url}")
+            print(f"Text: '{link_text}'")
+            print(f"Has pagination: {has_pagination}")
+            print(f"Has show param: {has_show_param}")
+            print(f"Potential issues: {potential_issues_count}")
             
         print(f"\nTotal simple-good/contextual-bad: {len(simple_good)}")
     
     # Look at pagination specifically
-    pagination_links = df[df['has_pagination'] == True]
     print(f"\n=== Pagination Analysis ===")
-    print(f"Total pagination links: {len(pagination_links)}")
-    print(f"Main list pagination: {pagination_links['is_main_list_pagination'].sum()}")
-    print(f"Nested pagination: {pagination_links['is_nested_pagination'].sum()}")
+    print(f"Total pagination links: {pagination_count}")
+    print(f"Main list pagination: {main_list_pagination_count}")
+    print(f"Nested pagination: {nested_pagination_count}")
     
-    if len(pagination_links) > 0:
+    if pagination_count > 0:
         print("\nSample pagination links:")
-        for idx, row in pagination_links.head(3).iterrows():
-            print(f"  {row['url']} - Simple: {row['label_simple']}, Contextual: {row['label_contextual']}")
+        pagination_sample = pd.concat(pagination_samples).head(SAMPLE_SIZE)
+        for url, label_simple, label_contextual in pagination_sample[['url', 'label_simple', 'label_contextual']].to_numpy():
+            print(f"  {url} - Simple: {label_simple}, Contextual: {label_contextual}")
     
     # Look at show parameters
-    show_links = df[df['has_show_param'] == True]
     print(f"\n=== Show Parameter Analysis ===")
-    print(f"Total show param links: {len(show_links)}")
-    print(f"View toggles: {show_links['is_view_toggle'].sum()}")
+    print(f"Total show param links: {show_count}")
+    print(f"View toggles: {view_toggle_count}")
     
-    if len(show_links) > 0:
+    if show_count > 0:
         print("\nSample show parameter links:")
-        for idx, row in show_links.head(3).iterrows():
-            print(f"  {row['url']} - Simple: {row['label_simple']}, Contextual: {row['label_contextual']}")
-            print(f"    Show value: '{row['show_param_value']}', Is view toggle: {row['is_view_toggle']}")
+        show_sample = pd.concat(show_samples).head(SAMPLE_SIZE)
+        sample_cols = ['url', 'label_simple', 'label_contextual', 'show_param_value', 'is_view_toggle']
+        for url, label_simple, label_contextual, show_param_value, is_view_toggle in show_sample[sample_cols].to_numpy():
+            print(f"  {url} - Simple: {label_simple}, Contextual: {label_contextual}")
+            print(f"    Show value: '{show_param_value}', Is view toggle: {is_view_toggle}")
 
 if __name__ == "__main__":
     analyze_label_differences()
\ No newline at end of file
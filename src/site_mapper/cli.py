@@ -1,4 +1,5 @@
 import argparse
+import asyncio
 import logging
 from pathlib import Path
 from typing import List
@@ -67,12 +68,12 @@ def main():
         logging.info(f"Starting crawl of {args.url}")
         logging.info(f"Results will be saved to {output_dir}")
         
-        link_graph = crawl_site(
+        link_graph = asyncio.run(crawl_site(
             args.url,
             scope_rules=config,
             analysis_functions=get_default_analyzers(),
             output_handler=output_handler
-        )
+        ))
         
         logging.info(f"Crawl completed. Processed {len(link_graph)} pages")
         
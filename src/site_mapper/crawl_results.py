@@ -0,0 +1,86 @@
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import ijson
+import orjson
+import pyarrow.parquet as pq
+
+def iter_crawl_results(path):
+    """
+    Yield (source_url, links) pairs from saved crawl results one page at a time,
+    so the whole crawl never has to be held in memory.
+
+    Reads the final JSON or Parquet output, or the NDJSON file appended during a crawl.
+    """
+    path = Path(path)
+    with open(path, 'rb') as f:
+        if path.suffix == '.ndjson':
+            for line in f:
+                if line.strip():
+                    yield from json.loads(line).items()
+        elif path.suffix == '.parquet':
+            yield from _iter_parquet_pages(pq.ParquetFile(f))
+        else:
+            yield from ijson.kvitems(f, '', use_float=True)
+
+def _iter_parquet_pages(parquet_file):
+    """Regroup Parquet link rows, which are written page by page, into (source_url, links) pairs"""
+    source_url, links = None, []
+    for batch in parquet_file.iter_batches():
+        for row in batch.to_pylist():
+            if row['source_url'] != source_url:
+                if links:
+                    yield source_url, links
+                source_url, links = row['source_url'], []
+            links.append({
+                'href': row['href'],
+                'absolute_url': row['absolute_url'],
+                'text': row['text'],
+                'is_external': row['is_external'],
+                'analysis': orjson.loads(row['analysis_json']),
+            })
+    if links:
+        yield source_url, links
+
+@dataclass(slots=True)
+class LinkFeatures:
+    """The parts of one crawled link that the training datasets use, pulled out of its nested analysis"""
+    absolute_url: str
+    text: str
+    is_external: bool
+    dom_hierarchy: str
+    css_classes: list[str]
+    parent_elements: list[str]
+    link_position: str
+    has_query_params: bool
+    has_sort_param: bool
+    has_filter_param: bool
+    has_page_param: bool
+    has_show_param: bool
+    in_faceted_search: bool
+    potential_issues: list[str]
+    path_segments: list[str]
+
+    @classmethod
+    def from_link(cls, link_data):
+        """Build from a link as saved by the crawler, defaulting any analysis that is missing"""
+        analysis = link_data.get('analysis', {})
+        archive_analysis = analysis.get('analyze_archive_it_link', {})
+        return cls(
+            absolute_url=link_data['absolute_url'],
+            text=link_data['text'],
+            is_external=link_data['is_external'],
+            dom_hierarchy=analysis.get('dom_hierarchy', ''),
+            css_classes=analysis.get('css_classes', []),
+            parent_elements=analysis.get('parent_elements', []),
+            link_position=analysis.get('link_position', ''),
+            has_query_params=archive_analysis.get('has_query_params', False),
+            has_sort_param=archive_analysis.get('has_sort_param', False),
+            has_filter_param=archive_analysis.get('has_filter_param', False),
+            has_page_param=archive_analysis.get('has_page_param', False),
+            has_show_param=archive_analysis.get('has_show_param', False),
+            in_faceted_search=archive_analysis.get('in_faceted_search_ui', False),
+            potential_issues=archive_analysis.get('potential_issues', []),
+            path_segments=archive_analysis.get('path_segments', []),
+        )
@@ -1,14 +1,18 @@
+import os
 import json
 import time
+import asyncio
 import logging
-from collections import deque
-from urllib.parse import urljoin, urlparse
-from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
-from playwright.sync_api import Page, sync_playwright, Browser, TimeoutError as PlaywrightTimeout
+from playwright.async_api import Page, async_playwright, Browser, BrowserContext, Error as PlaywrightError, TimeoutError as PlaywrightTimeout
 
 from site_mapper.outlink_analyzers import *
 from site_mapper.output_handler import OutputHandler
+from site_mapper.http_cache import HttpCache, PageAnalysisCache
+
+logger = logging.getLogger(__name__)
 
 class CrawlerError(Exception):
     """Base class for crawler exceptions"""
@@ -22,14 +26,17 @@ class RateLimiter:
     def __init__(self, delay: float = 1.0):
         self.delay = delay
         self.last_request_time = 0
+        # Callers queue here so a limiter shared by many tasks keeps the same spacing
+        self._lock = asyncio.Lock()
 
-    def wait(self):
+    async def wait(self):
         """Wait appropriate amount of time between requests"""
-        now = time.time()
-        time_since_last = now - self.last_request_time
-        if time_since_last < self.delay:
-            time.sleep(self.delay - time_since_last)
-        self.last_request_time = time.time()
+        async with self._lock:
+            now = time.time()
+            time_since_last = now - self.last_request_time
+            if time_since_last < self.delay:
+                await asyncio.sleep(self.delay - time_since_last)
+            self.last_request_time = time.time()
 
 def is_url_in_scope(url: str, scope_rules: dict) -> bool:
     """Check if a URL is in scope based on scope rules"""
@@ -39,209 +46,384 @@ def is_url_in_scope(url: str, scope_rules: dict) -> bool:
     parsed_url = urlparse(url)
     return parsed_url.hostname in allowed_hosts
 
-def extract_outlinks_with_analysis(page: Page, base_url: str, analysis_functions: Optional[List[Callable]] = None) -> List[Dict[str, Any]]:
+def canonicalize_url(url: str) -> str:
+    """Key identifying the page a URL points at: lowercase host and no fragment"""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, parts.query, ''))
+
+def host_prefixes(hosts) -> tuple:
+    """URL prefixes that guarantee urlparse(url).hostname is one of hosts
+
+    Most matching links start with one of these; anything else (ports, userinfo,
+    mixed-case hosts, no path) needs a full parse.
+    """
+    return tuple(
+        f"{scheme}://{host}/" for host in hosts if host and host == host.lower() for scheme in ("http", "https")
+    )
+
+def build_host_checker(hosts) -> Callable[[str], bool]:
+    """Build a check for urlparse(url).hostname being one of hosts, specialised for those hosts"""
+    hosts = frozenset(hosts)
+    prefixes = host_prefixes(hosts)
+
+    def has_host(url: str) -> bool:
+        return url.startswith(prefixes) or urlparse(url).hostname in hosts
+
+    return has_host
+
+def build_scope_checker(scope_rules: dict) -> Callable[[str], bool]:
+    """Build is_url_in_scope for these scope rules, skipping the parse for URLs on an allowed host prefix"""
+    if not scope_rules.get('allowed_hosts'):
+        return lambda url: True
+    prefixes = host_prefixes(scope_rules['allowed_hosts'])
+
+    def in_scope(url: str) -> bool:
+        return url.startswith(prefixes) or is_url_in_scope(url, scope_rules)
+
+    return in_scope
+
+async def extract_outlinks_with_analysis(page: Page, base_url: str, analysis_functions: Optional[Sequence[Callable]] = None) -> List[Dict[str, Any]]:
     """Extract all outlinks from the page and run analysis functions on each link element."""
-    if analysis_functions is None:
-        analysis_functions = []
+    # Resolve analyzer names once per page rather than once per link
+    analyzers = [(analysis_func.__name__, analysis_func) for analysis_func in analysis_functions or ()]
 
     try:
-        # Find all link elements
-        link_elements = page.locator('a[href]').all()
+        # Run the built-in analyzers on every link in one round-trip
+        links = await analyze_all_links(page)
+        # Element handles are only fetched if an analyzer is not covered by the batch
+        link_handles = None
+
+        is_internal = build_host_checker([urlparse(base_url).hostname])
 
         outlinks = []
-        for element in link_elements:
+        for index, link in enumerate(links):
             try:
                 # Get basic link information
-                href = element.get_attribute('href')
-                text = element.inner_text().strip()
+                href = link['href']
+                text = link['text']
 
                 # Resolve relative URLs
                 absolute_url = urljoin(base_url, href)
 
-                parsed_base = urlparse(base_url)
-                parsed_link = urlparse(absolute_url)
-
                 link_data = {
                     'href': href,
                     'absolute_url': absolute_url,
                     'text': text,
-                    'is_external': parsed_base.hostname != parsed_link.hostname,
+                    'is_external': not is_internal(absolute_url),
                     'analysis': {}
                 }
 
                 # Run analysis functions on this link element
-                for analysis_func in analysis_functions:
+                for func_name, analysis_func in analyzers:
+                    if func_name in link['analysis']:
+                        link_data['analysis'][func_name] = link['analysis'][func_name]
+                        continue
                     try:
-                        func_name = analysis_func.__name__
-                        link_data['analysis'][func_name] = analysis_func(page, element.element_handle())
+                        if link_handles is None:
+                            link_handles = await page.query_selector_all('a[href]')
+                        link_data['analysis'][func_name] = await analysis_func(page, link_handles[index])
                     except Exception as e:
-                        logging.error(f"Error running {analysis_func.__name__} on link {absolute_url}: {e}")
+                        logger.error("Error running %s on link %s: %s", func_name, absolute_url, e)
                         link_data['analysis'][func_name] = None
 
                 outlinks.append(link_data)
 
             except Exception as e:
-                logging.error(f"Error processing link element: {e}")
+                logger.error("Error processing link element: %s", e)
                 continue
 
         return outlinks
     except Exception as e:
-        logging.error(f"Error extracting outlinks: {e}")
+        logger.error("Error extracting outlinks: %s", e)
         raise NetworkError(f"Failed to extract outlinks: {e}")
 
-def crawl_page(browser: Browser, url: str, analysis_functions: Optional[List[Callable]] = None, max_retries: int = 3) -> Dict[str, Any]:
-    """Crawl a page and extract outlinks with optional analysis functions."""
+# Chromium features a batch crawler never uses
+CHROMIUM_ARGS = [
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--disable-background-networking',
+]
+
+# Resources that cost bandwidth but never affect which links are on a page.
+# Images, fonts, stylesheets and scripts are still loaded since they change the
+# layout the analyzers measure. Blocked video without an explicit size keeps the
+# default 300x150 box, which is a small layout difference worth the bandwidth.
+BLOCKED_RESOURCE_TYPES = frozenset({'media'})
+
+async def handle_route(route, http_cache: Optional[HttpCache] = None):
+    """Block wayback.archive-it.org and heavy resources, serve the rest through the cache if any"""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    elif "wayback.archive-it.org" in request.url:
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Blocked request to: %s", request.url)
+        await route.abort()
+    elif http_cache is not None and request.method == 'GET':
+        cached = http_cache.get(request.url, request.headers)
+        if cached:
+            await route.fulfill(status=cached['status'], headers=cached['headers'], body=cached['body'])
+            return
+        try:
+            # Redirects are handed back to the browser so the page ends up at the final URL
+            response = await route.fetch(max_redirects=0)
+            body = await response.body()
+        except PlaywrightError:
+            # Surface network failures to the page the same way an uncached request would
+            await route.abort()
+            return
+        http_cache.put(request.url, request.headers, response.status, response.headers, body)
+        await route.fulfill(response=response, body=body)
+    else:
+        await route.continue_()
+
+async def open_crawl_page(context: BrowserContext, http_cache: Optional[HttpCache] = None) -> Page:
+    """Open a page with the analyzers and request blocking set up, to be reused for many crawls"""
+    page = await context.new_page()
+    await install_analyzers(page)
+    # Enable request interception
+    await page.route("**/*", lambda route: handle_route(route, http_cache))
+    return page
+
+def response_validator(response) -> Optional[str]:
+    """Identify the version of a page by the ETag or Last-Modified of a response for it, or None if it has neither"""
+    if not response.ok:
+        return None
+    headers = response.headers
+    validator = headers.get('etag') or headers.get('last-modified')
+    return f"{response.url}\n{validator}" if validator else None
+
+async def page_validator(context: BrowserContext, url: str) -> Optional[str]:
+    """Identify the current version of url from a HEAD request, or None if it cannot be identified"""
+    try:
+        response = await context.request.head(url, timeout=30000)
+    except PlaywrightError as e:
+        logger.debug("HEAD request for %s failed: %s", url, e)
+        return None
+    return response_validator(response)
+
+async def crawl_page(page: Page, url: str, analysis_functions: Optional[Sequence[Callable]] = None, max_retries: int = 3) -> Dict[str, Any]:
+    """Navigate an open page to url and extract outlinks with optional analysis functions."""
     retry_count = 0
     while retry_count < max_retries:
-        page = browser.new_page()
         try:
-            # Set up request blocking for wayback.archive-it.org
-            def handle_route(route):
-                if "wayback.archive-it.org" in route.request.url:
-                    logging.info(f"Blocked request to: {route.request.url}")
-                    route.abort()
-                else:
-                    route.continue_()
-
-            # Enable request interception
-            page.route("**/*", handle_route)
-
-            logging.info(f"Attempting to crawl: {url}")
-            page.goto(url, timeout=30000)  # 30 second timeout
+            logger.info("Attempting to crawl: %s", url)
+            response = await page.goto(url, timeout=30000)  # 30 second timeout
 
             # Extract outlinks with analysis
-            outlinks = extract_outlinks_with_analysis(page, url, analysis_functions)
+            outlinks = await extract_outlinks_with_analysis(page, url, analysis_functions)
 
             return {
                 'url': url,
                 'outlinks': outlinks,
-                'outlinks_count': len(outlinks)
+                'outlinks_count': len(outlinks),
+                'validator': response_validator(response) if response else None
             }
 
         except PlaywrightTimeout:
             retry_count += 1
-            logging.warning(f"Timeout crawling {url}. Attempt {retry_count} of {max_retries}")
+            logger.warning("Timeout crawling %s. Attempt %d of %d", url, retry_count, max_retries)
             if retry_count == max_retries:
                 raise NetworkError(f"Failed to crawl {url} after {max_retries} attempts")
-            time.sleep(retry_count * 2)  # Exponential backoff
+            await asyncio.sleep(retry_count * 2)  # Exponential backoff
 
         except Exception as e:
-            logging.error(f"Error crawling {url}: {e}")
+            logger.error("Error crawling %s: %s", url, e)
             raise NetworkError(f"Failed to crawl {url}: {e}")
 
-        finally:
-            page.close()
-
-def log_link_analysis(url: str, link_data: Dict[str, Any]):
-    """Log interesting information about analyzed links"""
-    analysis = link_data['analysis'].get('analyze_archive_it_link', {})
-    if not analysis:
-        return
-        
+def log_link_analysis(url: str, analysis: Dict[str, Any]):
+    """Log interesting information from a link's Archive-It analysis"""
     # If there are potential issues, log them
     if analysis.get('potential_issues'):
-        issues = ', '.join(analysis['potential_issues'])
-        logging.info(f"Potential crawler trap at {url}: {issues}")
+        logger.info("Potential crawler trap at %s: %s", url, ', '.join(analysis['potential_issues']))
         
     # Log interesting URL patterns
     if analysis.get('path_segments'):
         path = '/'.join(analysis['path_segments'])
         if 'organization' in path or 'collection' in path:
-            logging.info(f"Found detail page: {url}")
+            logger.info("Found detail page: %s", url)
         elif 'explore' in path or 'browse' in path:
-            logging.info(f"Found list page: {url}")
+            logger.info("Found list page: %s", url)
 
-def crawl_site(seed_url: str, scope_rules: Dict[str, Any], analysis_functions: Optional[List[Callable]] = None, 
-               output_handler: Optional[OutputHandler] = None) -> Dict[str, List[Dict[str, Any]]]:
+async def crawl_site(seed_url: str, scope_rules: Dict[str, Any], analysis_functions: Optional[Sequence[Callable]] = None, 
+                     output_handler: Optional[OutputHandler] = None) -> Dict[str, List[Dict[str, Any]]]:
     """
     Crawl a site starting from seed_url and collect link analysis.
+
+    Pages are processed concurrently by scope_rules['concurrency'] workers
+    (the CPU count by default), each with its own browser context and a single reused
+    page. One rate limiter is shared by all workers, so scope_rules['delay']
+    is the spacing between requests to the site whatever the concurrency.
+    Concurrency overlaps page loading and analysis, it does not raise the
+    request rate.
     
     Args:
         seed_url: Starting URL for crawl
         scope_rules: Dictionary containing crawl rules
-        analysis_functions: List of functions to analyze links
+        analysis_functions: List of async functions to analyze links
         output_handler: Optional OutputHandler for saving results
     """
-    # Ensure our Archive-It analyzer is included
-    if analysis_functions is None:
-        analysis_functions = []
+    # Ensure our Archive-It analyzer is included, without modifying the caller's list
+    analysis_functions = tuple(analysis_functions or ())
     if analyze_archive_it_link not in analysis_functions:
-        analysis_functions.append(analyze_archive_it_link)
+        analysis_functions += (analyze_archive_it_link,)
     
     link_graph = {}
-    visited = set()
-    frontier_set = set()
-    frontier_queue = deque()
+    # Every URL already considered for the frontier, both as found in links and
+    # in canonical form, so repeated links are rejected without being reparsed
+    seen = set()
+    frontier_queue = asyncio.Queue()
+    pages_crawled = 0
+    page_limit = scope_rules.get('page_limit', 100)
+    in_scope = build_scope_checker(scope_rules)
+    http_cache = None
+    if scope_rules.get('http_cache_dir'):
+        http_cache = HttpCache(scope_rules['http_cache_dir'], scope_rules.get('http_cache_max_age', 86400))
+    analysis_cache = None
+    if scope_rules.get('analysis_cache_dir'):
+        analysis_cache = PageAnalysisCache(scope_rules['analysis_cache_dir'], scope_rules.get('analysis_cache_max_entries', 10000))
+    analyzer_names = [analysis_func.__name__ for analysis_func in analysis_functions]
+    # Never open more browser contexts than there are pages to crawl
+    concurrency = min(scope_rules.get('concurrency') or os.cpu_count() or 4, page_limit)
     rate_limiter = RateLimiter(delay=scope_rules.get('delay', 1.0))
 
-    add_to_frontier = lambda url: frontier_set.add(url) or frontier_queue.append(url)
-    
-    def pop_from_frontier():
-        url = frontier_queue.popleft() if frontier_queue else None
-        if url:
-            frontier_set.remove(url)
-        return url
-
-    # Seed our crawl
-    add_to_frontier(seed_url)
-    
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=True)
-
+    def maybe_enqueue(url):
+        if url in seen:
+            return
+        key = canonicalize_url(url)
+        if key not in seen and in_scope(key):
+            frontier_queue.put_nowait(key)
+        seen.add(key)
+        seen.add(url)
+
+    async def crawl_worker(browser: Browser):
+        nonlocal pages_crawled
+        context = await browser.new_context()
         try:
-            while page_url := pop_from_frontier():
-                if len(visited) >= scope_rules.get('page_limit', 100):
-                    logging.info("Reached page limit, stopping crawl")
-                    break
-                
-                if page_url in visited:
-                    continue
-
-                logging.info(f"Crawling {page_url}")
-                visited.add(page_url)
+            page = await open_crawl_page(context, http_cache)
+            while True:
+                page_url = await frontier_queue.get()
+                try:
+                    # Drain whatever is left in the frontier once the limit is hit
+                    if pages_crawled >= page_limit:
+                        continue
 
-                # Rate limiting
-                rate_limiter.wait()
+                    logger.info("Crawling %s", page_url)
+                    pages_crawled += 1
 
-                try:
-                    result = crawl_page(
-                        browser, 
-                        page_url, 
-                        analysis_functions,
-                        max_retries=scope_rules.get('max_retries', 3)
-                    )
-                    logging.info(f"Found {result['outlinks_count']} outlinks on {page_url}")
-
-                    # Add new URLs to the frontier
-                    for link in result['outlinks']:
-                        # Log analysis results for this link
-                        log_link_analysis(link['absolute_url'], link)
-                        
-                        if (link['absolute_url'] not in visited and 
-                            link['absolute_url'] not in frontier_set):
-                            if is_url_in_scope(link['absolute_url'], scope_rules):
-                                add_to_frontier(link['absolute_url'])
-
-                    # Add the outlink results
-                    link_graph[page_url] = result['outlinks']
-
-                    # Save intermediate results if handler provided
-                    if output_handler:
-                        output_handler.save_json(link_graph, "crawl_results_intermediate.json")
-
-                except NetworkError as e:
-                    logging.error(f"Network error crawling {page_url}: {e}")
-                    continue
-                except Exception as e:
-                    logging.error(f"Unexpected error crawling {page_url}: {e}")
-                    continue
+                    # Rate limiting
+                    await rate_limiter.wait()
 
+                    try:
+                        # Reuse the analysis of an unchanged page from an earlier crawl; only pages
+                        # already in the cache are worth a HEAD request to see if they changed
+                        revisit = analysis_cache is not None and analysis_cache.has_url(page_url)
+                        validator = await page_validator(context, page_url) if revisit else None
+                        cached_outlinks = analysis_cache.get(page_url, validator, analyzer_names) if validator else None
+                        if cached_outlinks is not None:
+                            logger.info("Using cached analysis for %s", page_url)
+                            result = {
+                                'url': page_url,
+                                'outlinks': cached_outlinks,
+                                'outlinks_count': len(cached_outlinks)
+                            }
+                        else:
+                            # The HEAD request above used this page's rate limit slot
+                            if revisit:
+                                await rate_limiter.wait()
+                            # Replace the page if it was closed underneath us
+                            if page.is_closed():
+                                page = await open_crawl_page(context, http_cache)
+                            result = await crawl_page(
+                                page, 
+                                page_url, 
+                                analysis_functions,
+                                max_retries=scope_rules.get('max_retries', 3)
+                            )
+                            if analysis_cache is not None and result['validator']:
+                                analysis_cache.put(page_url, result['validator'], analyzer_names, result['outlinks'])
+                        logger.info("Found %d outlinks on %s", result['outlinks_count'], page_url)
+
+                        # Link analysis is only logged at INFO, so skip it entirely otherwise
+                        log_analysis = logger.isEnabledFor(logging.INFO)
+
+                        # Add new URLs to the frontier
+                        for link in result['outlinks']:
+                            # Log analysis results for this link
+                            if log_analysis:
+                                analysis = link['analysis'].get('analyze_archive_it_link')
+                                if analysis:
+                                    log_link_analysis(link['absolute_url'], analysis)
+                            maybe_enqueue(link['absolute_url'])
+
+                        # Add the outlink results
+                        link_graph[page_url] = result['outlinks']
+
+                        # Append this page's results if handler provided
+                        if output_handler:
+                            output_handler.append_ndjson({page_url: result['outlinks']}, "crawl_results.ndjson")
+                        if parquet_writer:
+                            parquet_writer.append(page_url, result['outlinks'])
+
+                    except NetworkError as e:
+                        logger.error("Network error crawling %s: %s", page_url, e)
+                    except Exception as e:
+                        logger.error("Unexpected error crawling %s: %s", page_url, e)
+                finally:
+                    frontier_queue.task_done()
         finally:
-            browser.close()
+            await context.close()
+
+    # Seed our crawl, which is always crawled even if out of scope
+    seed_key = canonicalize_url(seed_url)
+    seen.add(seed_key)
+    frontier_queue.put_nowait(seed_key)
+    output_formats = scope_rules.get('output_formats', ['json', 'csv'])
+    parquet_writer = None
+    if output_handler:
+        output_handler.truncate("crawl_results.ndjson")
+        # Parquet is written page by page rather than from the final link graph
+        if 'parquet' in output_formats:
+            parquet_writer = output_handler.open_parquet_writer("crawl_results_final.parquet")
+    
+    try:
+        async with async_playwright() as pw:
+            browser = await pw.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+
+            try:
+                workers = [
+                    asyncio.create_task(crawl_worker(browser))
+                    for _ in range(max(concurrency, 1))
+                ]
+                frontier_drained = asyncio.create_task(frontier_queue.join())
+                try:
+                    # Workers only return early when they fail, so stop on whichever comes first
+                    await asyncio.wait([frontier_drained, *workers], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    frontier_drained.cancel()
+                    for worker in workers:
+                        worker.cancel()
+                    worker_results = await asyncio.gather(*workers, return_exceptions=True)
+
+                for worker_result in worker_results:
+                    if isinstance(worker_result, Exception):
+                        raise CrawlerError(f"Crawl worker failed: {worker_result}") from worker_result
+
+                if pages_crawled >= page_limit:
+                    logger.info("Reached page limit, stopping crawl")
+
+            finally:
+                await browser.close()
+    finally:
+        # Close even if the browser never launched, so the file always gets its footer
+        if parquet_writer:
+            parquet_writer.close()
 
     # Save final results if handler provided
     if output_handler:
-        output_handler.save_json(link_graph, "crawl_results_final.json")
-        output_handler.save_csv(link_graph, "crawl_results_final.csv")
+        if 'json' in output_formats:
+            output_handler.save_json(link_graph, "crawl_results_final.json")
+        if 'csv' in output_formats:
+            output_handler.save_csv(link_graph, "crawl_results_final.csv")
 
-    return link_graph
\ No newline at end of file
+    return link_graph
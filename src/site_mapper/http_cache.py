@@ -0,0 +1,142 @@
+import os
+import zlib
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import orjson
+
+# The cached body is stored already decoded, so these no longer describe it
+STRIPPED_HEADERS = frozenset({'content-encoding', 'content-length', 'transfer-encoding'})
+
+# Cache-Control directives that forbid storing the response in a shared cache
+UNCACHEABLE_DIRECTIVES = frozenset({'no-store', 'private'})
+
+def is_cacheable(status: int, headers: Dict[str, str]) -> bool:
+    """Whether a response may be stored: only 200s not marked no-store or private and not Vary: *"""
+    if status != 200:
+        return False
+    directives = {directive.strip().split('=', 1)[0] for directive in headers.get('cache-control', '').lower().split(',')}
+    return directives.isdisjoint(UNCACHEABLE_DIRECTIVES) and headers.get('vary', '').strip() != '*'
+
+def vary_values(vary: str, request_headers: Dict[str, str]) -> Dict[str, str]:
+    """The request headers named by a response's Vary header, which a cached copy must match"""
+    names = (name.strip().lower() for name in vary.split(','))
+    return {name: request_headers.get(name, '') for name in names if name}
+
+class HttpCache:
+    """
+    File-backed cache of HTTP responses keyed by URL, shared across crawl runs.
+    One variant is kept per URL; it is only served to requests whose headers match
+    the ones named in its Vary header.
+    """
+
+    def __init__(self, cache_dir: str, max_age: float = 86400):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.cache_dir / f"{key}.body", self.cache_dir / f"{key}.json"
+
+    def get(self, url: str, request_headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Return the cached status, headers and body for this request, or None if missing, stale or a different variant"""
+        body_path, meta_path = self._paths(url)
+        try:
+            if time.time() - meta_path.stat().st_mtime > self.max_age:
+                return None
+            meta = json.loads(meta_path.read_text())
+            if vary_values(meta.get('vary', ''), request_headers) != meta.get('vary_values', {}):
+                return None
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        return {'status': meta['status'], 'headers': meta['headers'], 'body': body}
+
+    def put(self, url: str, request_headers: Dict[str, str], status: int, headers: Dict[str, str], body: bytes):
+        """Store a response for url, unless is_cacheable rules it out"""
+        if not is_cacheable(status, headers):
+            return
+        body_path, meta_path = self._paths(url)
+        body_path.write_bytes(body)
+        vary = headers.get('vary', '')
+        # Metadata is written last so a partial write is never read back as an entry
+        meta_path.write_text(json.dumps({
+            'url': url,
+            'status': status,
+            'headers': {name: value for name, value in headers.items() if name.lower() not in STRIPPED_HEADERS},
+            'vary': vary,
+            'vary_values': vary_values(vary, request_headers),
+        }))
+
+class PageAnalysisCache:
+    """
+    File-backed cache of a page's analyzed outlinks, keyed by URL, the page's ETag or
+    Last-Modified validator and the analyzers run, shared across crawl runs.
+    Entries are zlib-compressed JSON named after the URL's hash, so has_url can tell
+    which pages were analysed before without touching the disk; the least recently
+    used are dropped whenever a put would take the cache beyond max_entries.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 10000):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.entry_count = 0
+        self.url_keys = set()
+        self.prune()
+
+    def _url_key(self, url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _path(self, url: str, validator: str, analyzer_names: Sequence[str]) -> Path:
+        version_key = hashlib.sha256('\n'.join([validator, *analyzer_names]).encode()).hexdigest()
+        return self.cache_dir / f"{self._url_key(url)}-{version_key}.json.z"
+
+    def has_url(self, url: str) -> bool:
+        """Whether some version of url is cached"""
+        return self._url_key(url) in self.url_keys
+
+    def get(self, url: str, validator: str, analyzer_names: Sequence[str]) -> Optional[List[Dict[str, Any]]]:
+        """Return the cached outlinks for this version of the page, or None"""
+        path = self._path(url, validator, analyzer_names)
+        try:
+            outlinks = orjson.loads(zlib.decompress(path.read_bytes()))
+            # Mark as recently used
+            os.utime(path)
+        except (OSError, ValueError, zlib.error):
+            return None
+        return outlinks
+
+    def put(self, url: str, validator: str, analyzer_names: Sequence[str], outlinks: List[Dict[str, Any]]):
+        """Store the outlinks found on this version of the page"""
+        path = self._path(url, validator, analyzer_names)
+        # Written under a temporary name so a partial write is never read back as an entry
+        temp_path = path.with_suffix('.tmp')
+        temp_path.write_bytes(zlib.compress(orjson.dumps(outlinks)))
+        if not path.exists():
+            self.entry_count += 1
+        temp_path.replace(path)
+        self.url_keys.add(self._url_key(url))
+        if self.entry_count > self.max_entries:
+            # Prune a tenth below the limit so the directory is not rescanned on every put
+            self.prune(self.max_entries - self.max_entries // 10)
+
+    def prune(self, keep: Optional[int] = None):
+        """Drop the least recently used entries beyond keep (max_entries by default)"""
+        if keep is None:
+            keep = self.max_entries
+        entries = []
+        for path in self.cache_dir.glob('*.json.z'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        entries.sort(reverse=True)
+        for _, path in entries[keep:]:
+            path.unlink(missing_ok=True)
+        self.entry_count = min(len(entries), keep)
+        self.url_keys = {path.name.split('-', 1)[0] for _, path in entries[:keep]}
@@ -1,102 +1,197 @@
-from playwright.sync_api import Page
-from urllib.parse import urlparse, parse_qs
+from functools import lru_cache
+from playwright.async_api import Page
+from urllib.parse import urlparse
 
+from site_mapper.url_parsing import parse_query
 
-def dom_hierarchy(page: Page, element) -> str:
-    """Get the DOM hierarchy path to an element as a string"""
-    return page.evaluate("""
-        (element) => {
-            const path = [];
-            let current = element;
-            while (current && current.nodeType === Node.ELEMENT_NODE) {
-                let selector = current.tagName.toLowerCase();
-                if (current.id) {
-                    selector += '#' + current.id;
-                } else if (current.className) {
-                    selector += '.' + current.className.split(' ').join('.');
-                }
-                path.unshift(selector);
+
+# Installed once per page by install_analyzers() so each evaluate call below only
+# ships a short caller instead of the whole analyzer source. Every analyzer in this
+# module needs it on the page before navigating.
+ANALYZERS_JS = """
+window.__siteMapper = (() => {
+    const FACETED_SEARCH_SELECTOR = '.faceted-search, .filters, .sorting, [data-testid*="facet"]';
+    const STYLE_PROPERTIES = ['color', 'background-color', 'font-size', 'font-weight'];
+
+    // Links share most of their ancestors, so each ancestor's path is built once per cache
+    const domHierarchy = (element, cache = new WeakMap()) => {
+        let path = cache.get(element);
+        if (path !== undefined) return path;
+
+        let selector = element.tagName.toLowerCase();
+        const className = element.getAttribute('class');
+        if (element.id) {
+            selector += '#' + element.id;
+        } else if (className) {
+            selector += '.' + className.split(' ').join('.');
+        }
+        const parent = element.parentElement;
+        path = parent ? domHierarchy(parent, cache) + ' > ' + selector : selector;
+        cache.set(element, path);
+        return path;
+    };
+
+    const boundingBox = (element) => {
+        const rect = element.getBoundingClientRect();
+        return {
+            x: rect.x,
+            y: rect.y,
+            width: rect.width,
+            height: rect.height
+        };
+    };
+
+    const cssClasses = (element) => Array.from(element.classList);
+
+    const computedStyles = (element, properties = STYLE_PROPERTIES) => {
+        const styles = window.getComputedStyle(element);
+        const result = {};
+        properties.forEach(prop => {
+            result[prop] = styles.getPropertyValue(prop);
+        });
+        return result;
+    };
+
+    // Links with the same ancestry and attributes are styled alike (every row of a
+    // result list, say), so their styles are computed once per page. Rules that only
+    // match on href or on position, like :nth-child, are not told apart.
+    const styleSignature = (element, hierarchyCache) => {
+        let signature = domHierarchy(element, hierarchyCache);
+        for (const attribute of element.attributes) {
+            if (attribute.name !== 'href') signature += '|' + attribute.name + '=' + attribute.value;
+        }
+        return signature;
+    };
+
+    const cachedComputedStyles = (element, hierarchyCache, styleCache) => {
+        const signature = styleSignature(element, hierarchyCache);
+        let styles = styleCache.get(signature);
+        if (styles === undefined) {
+            styles = computedStyles(element);
+            styleCache.set(signature, styles);
+        }
+        return {...styles};
+    };
+
+    const positionOf = (rect) => {
+        const windowHeight = window.innerHeight;
+        const windowWidth = window.innerWidth;
+
+        let position = [];
+        if (rect.top < windowHeight / 3) position.push('top');
+        else if (rect.top > windowHeight * 2/3) position.push('bottom');
+        else position.push('middle');
+
+        if (rect.left < windowWidth / 3) position.push('left');
+        else if (rect.left > windowWidth * 2/3) position.push('right');
+        else position.push('center');
+
+        return position.join('-');
+    };
+
+    const linkPosition = (element) => positionOf(element.getBoundingClientRect());
+
+    // Sibling links have the same parents, so the chain is cached by parent element
+    const parentElements = (element, cache = new WeakMap()) => {
+        const parent = element.parentElement;
+        if (!parent) return [];
+        let parents = cache.get(parent);
+        if (parents === undefined) {
+            parents = [];
+            let current = parent;
+            let depth = 0;
+            while (current && depth < 5) {  // Limit to 5 levels up
+                parents.push(current.tagName.toLowerCase());
                 current = current.parentElement;
+                depth++;
             }
-            return path.join(' > ');
+            cache.set(parent, parents);
         }
-    """, element)
+        return parents.slice();
+    };
+
+    const inFacetedSearch = (element) => Boolean(element.closest(FACETED_SEARCH_SELECTOR));
+
+    // Every built-in analyzer for one link, reading its layout only once
+    const analyzeLink = (element, hierarchyCache = new WeakMap(), parentsCache = new WeakMap(), styleCache = new Map()) => {
+        const rect = element.getBoundingClientRect();
+        const text = 'innerText' in element ? element.innerText : element.textContent;
+        return {
+            href: element.getAttribute('href'),
+            text: (text || '').trim(),
+            in_faceted_search: inFacetedSearch(element),
+            analysis: {
+                dom_hierarchy: domHierarchy(element, hierarchyCache),
+                bounding_box: {x: rect.x, y: rect.y, width: rect.width, height: rect.height},
+                css_classes: cssClasses(element),
+                computed_styles: cachedComputedStyles(element, hierarchyCache, styleCache),
+                link_position: positionOf(rect),
+                parent_elements: parentElements(element, parentsCache)
+            }
+        };
+    };
 
+    const analyzeLinks = (elements) => {
+        const hierarchyCache = new WeakMap();
+        const parentsCache = new WeakMap();
+        const styleCache = new Map();
+        return elements.map((element) => analyzeLink(element, hierarchyCache, parentsCache, styleCache));
+    };
+
+    return {
+        domHierarchy,
+        boundingBox,
+        cssClasses,
+        computedStyles,
+        linkPosition,
+        parentElements,
+        inFacetedSearch,
+        analyzeLink,
+        analyzeLinks
+    };
+})();
+"""
+
+
+async def install_analyzers(page: Page):
+    """Register the analyzer scripts on every document the page loads from now on"""
+    await page.add_init_script(ANALYZERS_JS)
+
+
+async def dom_hierarchy(page: Page, element) -> str:
+    """Get the DOM hierarchy path to an element as a string"""
+    return await page.evaluate("(element) => window.__siteMapper.domHierarchy(element)", element)
 
-def bounding_box(page: Page, element) -> dict[str, float]:
+
+async def bounding_box(page: Page, element) -> dict[str, float]:
     """Get the bounding box of an element"""
-    return page.evaluate("""
-        (element) => {
-            const rect = element.getBoundingClientRect();
-            return {
-                x: rect.x,
-                y: rect.y,
-                width: rect.width,
-                height: rect.height
-            };
-        }
-    """, element)
+    return await page.evaluate("(element) => window.__siteMapper.boundingBox(element)", element)
 
 
-def css_classes(page: Page, element) -> list[str]:
+async def css_classes(page: Page, element) -> list[str]:
     """Get CSS classes of an element"""
-    return page.evaluate("(element) => Array.from(element.classList)", element)
+    return await page.evaluate("(element) => window.__siteMapper.cssClasses(element)", element)
 
 
-def computed_styles(page: Page, element, properties: list[str] = ['color', 'background-color', 'font-size', 'font-weight']) -> dict[str, str]:
+async def computed_styles(page: Page, element, properties: list[str] = ['color', 'background-color', 'font-size', 'font-weight']) -> dict[str, str]:
     """Get computed CSS styles for specified properties"""
-    return page.evaluate("""
-        (element, properties) => {
-            const styles = window.getComputedStyle(element);
-            const result = {};
-            properties.forEach(prop => {
-                result[prop] = styles.getPropertyValue(prop);
-            });
-            return result;
-        }
-    """, element, properties)
+    return await page.evaluate(
+        "([element, properties]) => window.__siteMapper.computedStyles(element, properties)",
+        [element, properties]
+    )
 
 
-def link_position(page: Page, element) -> str:
+async def link_position(page: Page, element) -> str:
     """Custom function to determine link position in page"""
-    return page.evaluate("""
-            (element) => {
-                const rect = element.getBoundingClientRect();
-                const windowHeight = window.innerHeight;
-                const windowWidth = window.innerWidth;
-                
-                let position = [];
-                if (rect.top < windowHeight / 3) position.push('top');
-                else if (rect.top > windowHeight * 2/3) position.push('bottom');
-                else position.push('middle');
-                
-                if (rect.left < windowWidth / 3) position.push('left');
-                else if (rect.left > windowWidth * 2/3) position.push('right');
-                else position.push('center');
-                
-                return position.join('-');
-            }
-        """, element)
+    return await page.evaluate("(element) => window.__siteMapper.linkPosition(element)", element)
 
 
-def parent_elements(page: Page, element) -> list[str]:
+async def parent_elements(page: Page, element) -> list[str]:
     """Get the tag names of parent elements"""
-    return page.evaluate("""
-            (element) => {
-                const parents = [];
-                let current = element.parentElement;
-                let depth = 0;
-                while (current && depth < 5) {  // Limit to 5 levels up
-                    parents.push(current.tagName.toLowerCase());
-                    current = current.parentElement;
-                    depth++;
-                }
-                return parents;
-            }
-        """, element)
+    return await page.evaluate("(element) => window.__siteMapper.parentElements(element)", element)
 
 
-def analyze_archive_it_link(page: Page, element) -> dict:
+async def analyze_archive_it_link(page: Page, element) -> dict:
     """
     Step 1: Basic analysis of Archive-It links to identify potential crawler traps.
     
@@ -104,22 +199,26 @@ def analyze_archive_it_link(page: Page, element) -> dict:
     1. Is the link part of a faceted search interface?
     2. Does the URL suggest redundant content?
     """
-    # Get the href attribute
-    href = page.evaluate("(element) => element.getAttribute('href')", element)
+    # Get the href attribute and check if link is in a faceted search section
+    href, in_faceted_search = await page.evaluate(
+        "(element) => [element.getAttribute('href'), window.__siteMapper.inFacetedSearch(element)]",
+        element
+    )
     
-    # Parse the URL
+    return archive_it_link_analysis(href, in_faceted_search)
+
+
+@lru_cache(maxsize=8192)
+def _parse_href(href: str) -> tuple[str, tuple[str, ...]]:
+    """Path and query parameter names of an href, cached since pages repeat the same links"""
     parsed_url = urlparse(href)
-    query_params = parse_qs(parsed_url.query)
-    
-    # Check if link is in a faceted search section
-    in_faceted_search = page.evaluate("""
-        (element) => {
-            // Common class names and attributes for faceted search elements
-            return Boolean(
-                element.closest('.faceted-search, .filters, .sorting, [data-testid*="facet"]')
-            );
-        }
-    """, element)
+    return parsed_url.path, tuple(parse_query(parsed_url.query))
+
+
+def archive_it_link_analysis(href: str, in_faceted_search: bool) -> dict:
+    """Build the analyze_archive_it_link result from a link's href and faceted-search flag"""
+    # Parse the URL
+    path, query_params = _parse_href(href)
     
     # Analyze URL characteristics
     analysis = {
@@ -128,7 +227,7 @@ def analyze_archive_it_link(page: Page, element) -> dict:
         
         # URL analysis
         'has_query_params': bool(query_params),
-        'query_params': list(query_params.keys()),
+        'query_params': list(query_params),
         
         # Common patterns that might indicate redundant content
         'has_sort_param': 'sort' in query_params,
@@ -137,8 +236,8 @@ def analyze_archive_it_link(page: Page, element) -> dict:
         'has_show_param': 'show' in query_params,
         
         # Path analysis
-        'path': parsed_url.path,
-        'path_segments': parsed_url.path.strip('/').split('/')
+        'path': path,
+        'path_segments': path.strip('/').split('/')
     }
     
     # Add a human-readable explanation of potential issues
@@ -156,4 +255,38 @@ def analyze_archive_it_link(page: Page, element) -> dict:
         
     analysis['potential_issues'] = reasons
     
-    return analysis
\ No newline at end of file
+    return analysis
+
+
+def _add_archive_it_analysis(link: dict) -> dict:
+    """Derive analyze_archive_it_link for a link returned by analyzeLink"""
+    link['analysis']['analyze_archive_it_link'] = archive_it_link_analysis(
+        link['href'], link.pop('in_faceted_search')
+    )
+    return link
+
+
+async def analyze_link_batch(page: Page, element) -> dict:
+    """
+    Run the built-in analyzers on a single link element in one evaluate call.
+
+    Returns the link's href, text and an 'analysis' dict keyed by analyzer name,
+    the same as each entry of analyze_all_links().
+    """
+    link = await page.evaluate("(element) => window.__siteMapper.analyzeLink(element)", element)
+    return _add_archive_it_analysis(link)
+
+
+async def analyze_all_links(page: Page) -> list[dict]:
+    """
+    Run the built-in analyzers on every link of the page in a single evaluate call.
+
+    Links are matched with Playwright's own selector engine, so the returned list
+    lines up index-for-index with page.query_selector_all('a[href]'). Each entry
+    holds the link's href, text and an 'analysis' dict keyed by analyzer name.
+    """
+    links = await page.eval_on_selector_all('a[href]', "(elements) => window.__siteMapper.analyzeLinks(elements)")
+
+    for link in links:
+        _add_archive_it_analysis(link)
+    return links
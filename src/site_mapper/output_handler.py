@@ -1,8 +1,42 @@
-import json
-import csv
+import re
+import orjson
 from pathlib import Path
 from typing import Dict, Any, List
 
+# Rows formatted before each write in OutputHandler.save_csv
+CSV_CHUNK_ROWS = 8192
+
+# Links buffered per Parquet row group
+PARQUET_BATCH_ROWS = 10_000
+
+# Characters that make csv.writer quote a field with its default dialect
+CSV_QUOTE_NEEDED = re.compile(r'[,"\r\n]')
+
+def csv_field(value) -> str:
+    """Format one field the way csv.writer's default dialect does"""
+    if value is None:
+        return ''
+    value = str(value)
+    if CSV_QUOTE_NEEDED.search(value):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def write_dataframe_csv(df, output_path):
+    """
+    Write a DataFrame as CSV with pyarrow's C++ writer rather than pandas' Python one.
+    Booleans are written as True/False as pandas would, so the file reads back the same.
+    """
+    # pyarrow is only needed by the analysis scripts (the 'analysis' extra)
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for index, field in enumerate(table.schema):
+        if pa.types.is_boolean(field.type):
+            table = table.set_column(index, field.name, pc.if_else(table.column(index), 'True', 'False'))
+    pacsv.write_csv(table, str(output_path))
+
 class OutputHandler:
     def __init__(self, output_dir: str):
         self.output_dir = Path(output_dir)
@@ -11,22 +45,100 @@ class OutputHandler:
     def save_json(self, data: Dict[str, Any], filename: str = "crawl_results.json"):
         """Save results as JSON"""
         output_path = self.output_dir / filename
-        with open(output_path, 'w') as f:
-            json.dump(data, f, indent=2)
+        output_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+
+    def append_ndjson(self, record: Dict[str, Any], filename: str = "crawl_results.ndjson"):
+        """Append one record as a line of newline-delimited JSON"""
+        output_path = self.output_dir / filename
+        with open(output_path, 'ab') as f:
+            f.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+
+    def truncate(self, filename: str):
+        """Empty a file that results are appended to"""
+        output_path = self.output_dir / filename
+        open(output_path, 'wb').close()
 
     def save_csv(self, link_graph: Dict[str, List[Dict]], filename: str = "crawl_results.csv"):
         """Save results as CSV"""
         output_path = self.output_dir / filename
-        with open(output_path, 'w', newline='') as f:
-            writer = csv.writer(f)
+        with open(output_path, 'w', newline='', buffering=1 << 20) as f:
             # Write header
-            writer.writerow(['source_url', 'target_url', 'link_text', 'is_external'])
-            # Write data
+            f.write('source_url,target_url,link_text,is_external\r\n')
+            # Write data, formatting rows directly instead of through csv.writer
+            rows = []
             for source_url, links in link_graph.items():
+                source_field = csv_field(source_url)
                 for link in links:
-                    writer.writerow([
-                        source_url,
-                        link['absolute_url'],
-                        link['text'],
-                        link['is_external']
-                    ])
\ No newline at end of file
+                    rows.append(
+                        f"{source_field},{csv_field(link['absolute_url'])},"
+                        f"{csv_field(link['text'])},{csv_field(link['is_external'])}\r\n"
+                    )
+                    if len(rows) >= CSV_CHUNK_ROWS:
+                        f.writelines(rows)
+                        rows.clear()
+            f.writelines(rows)
+
+    def open_parquet_writer(self, filename: str = "crawl_results.parquet") -> "ParquetLinkWriter":
+        """Open a Parquet file that pages of links can be appended to as they are crawled"""
+        return ParquetLinkWriter(self.output_dir / filename)
+
+    def save_parquet(self, link_graph: Dict[str, List[Dict]], filename: str = "crawl_results.parquet"):
+        """Save results as Parquet, one row per link with its analysis as a JSON string"""
+        with self.open_parquet_writer(filename) as writer:
+            for source_url, links in link_graph.items():
+                writer.append(source_url, links)
+
+class ParquetLinkWriter:
+    """
+    Writes links to Parquet, one row per link with its analysis as a JSON string.
+    Rows are buffered and written as a row group every PARQUET_BATCH_ROWS links.
+    """
+
+    def __init__(self, output_path, batch_rows: int = PARQUET_BATCH_ROWS):
+        # pyarrow is only needed for this format (the 'parquet' extra)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.schema = pa.schema([
+            ('source_url', pa.string()),
+            ('href', pa.string()),
+            ('absolute_url', pa.string()),
+            ('text', pa.string()),
+            ('is_external', pa.bool_()),
+            ('analysis_json', pa.string()),
+        ])
+        self.batch_rows = batch_rows
+        self.columns = {name: [] for name in self.schema.names}
+        self.writer = pq.ParquetWriter(output_path, self.schema)
+
+    def append(self, source_url: str, links: List[Dict]):
+        """Add one page's links"""
+        columns = self.columns
+        for link in links:
+            columns['source_url'].append(source_url)
+            columns['href'].append(link['href'])
+            columns['absolute_url'].append(link['absolute_url'])
+            columns['text'].append(link['text'])
+            columns['is_external'].append(link['is_external'])
+            columns['analysis_json'].append(orjson.dumps(link['analysis']).decode())
+        if len(columns['source_url']) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows as a row group"""
+        if self.columns['source_url']:
+            self.writer.write_table(self._pa.table(self.columns, schema=self.schema))
+            for values in self.columns.values():
+                values.clear()
+
+    def close(self):
+        """Write any buffered rows and finish the file"""
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
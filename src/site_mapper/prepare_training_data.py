@@ -1,84 +1,130 @@
-import json
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
-def flatten_link_features(link_data):
+from site_mapper.crawl_results import LinkFeatures, iter_crawl_results
+from site_mapper.output_handler import write_dataframe_csv
+
+# Columns produced by flatten_link_features, in order
+FEATURE_COLUMNS = [
+    'url', 'link_text', 'is_external',
+    'dom_path', 'css_classes', 'in_navigation',
+    'position_on_page',
+    'has_query_params', 'has_sort_param', 'has_filter_param', 'has_page_param', 'has_show_param',
+    'is_detail_page', 'is_list_page',
+    'in_faceted_search', 'number_of_issues', 'issue_types',
+    'path_depth', 'path_components',
+]
+BOOL_FEATURE_COLUMNS = frozenset({
+    'is_external', 'in_navigation',
+    'has_query_params', 'has_sort_param', 'has_filter_param', 'has_page_param', 'has_show_param',
+    'is_detail_page', 'is_list_page', 'in_faceted_search',
+})
+COUNT_FEATURE_COLUMNS = frozenset({'number_of_issues', 'path_depth'})
+CATEGORY_COLUMNS = frozenset({'url', 'source_page', 'position_on_page'})
+
+# Parent tags that place a link in navigation
+NAVIGATION_TAGS = frozenset({'nav', 'header', 'menu'})
+
+def link_feature_values(link):
     """
-    Convert a nested JSON link structure into a flat dictionary of features.
-    This is the key to converting nested JSON to CSV format.
+    The values of flatten_link_features for a LinkFeatures, as a tuple in
+    FEATURE_COLUMNS order. Datasets are built from these so no dict is
+    created per link.
     """
-    # Get the nested analysis data
-    analysis = link_data.get('analysis', {})
-    archive_analysis = analysis.get('analyze_archive_it_link', {})
+    absolute_url = link.absolute_url
     
-    features = {
+    return (
         # Basic Features - Direct from top level
-        'url': link_data['absolute_url'],
-        'link_text': link_data['text'],
-        'is_external': link_data['is_external'],
+        absolute_url,
+        link.text,
+        link.is_external,
         
         # DOM Features - From analysis
-        'dom_path': analysis.get('dom_hierarchy', ''),
+        link.dom_hierarchy,
         # Convert array of classes to a string with ',' separator
-        'css_classes': ','.join(analysis.get('css_classes', [])),
+        ','.join(link.css_classes),
         # Check if link is in navigation based on parent elements
-        'in_navigation': any(
-            parent in ['nav', 'header', 'menu'] 
-            for parent in analysis.get('parent_elements', [])
-        ),
+        not NAVIGATION_TAGS.isdisjoint(link.parent_elements),
         
         # Position Features
-        'position_on_page': analysis.get('link_position', ''),
+        link.link_position,
         
         # URL Structure Features - From archive_analysis
-        'has_query_params': archive_analysis.get('has_query_params', False),
-        'has_sort_param': archive_analysis.get('has_sort_param', False),
-        'has_filter_param': archive_analysis.get('has_filter_param', False),
-        'has_page_param': archive_analysis.get('has_page_param', False),
-        'has_show_param': archive_analysis.get('has_show_param', False),
+        link.has_query_params,
+        link.has_sort_param,
+        link.has_filter_param,
+        link.has_page_param,
+        link.has_show_param,
         
         # Content Type Features - Derived from URL patterns
-        'is_detail_page': (
-            '/organizations/' in link_data['absolute_url'] or 
-            '/collections/' in link_data['absolute_url']
-        ),
-        'is_list_page': '/explore' in link_data['absolute_url'],
+        '/organizations/' in absolute_url or '/collections/' in absolute_url,
+        '/explore' in absolute_url,
         
         # Trap Detection Features
-        'in_faceted_search': archive_analysis.get('in_faceted_search_ui', False),
-        'number_of_issues': len(archive_analysis.get('potential_issues', [])),
+        link.in_faceted_search,
+        len(link.potential_issues),
         # Convert array of issues to a string
-        'issue_types': ','.join(archive_analysis.get('potential_issues', [])),
+        ','.join(link.potential_issues),
         
         # URL Complexity Features
-        'path_depth': len(archive_analysis.get('path_segments', [])),
-        'path_components': ','.join(archive_analysis.get('path_segments', [])),
-    }
-    
-    return features
+        len(link.path_segments),
+        ','.join(link.path_segments),
+    )
+
+def flatten_link_features(link_data):
+    """
+    Convert a nested JSON link structure into a flat dictionary of features.
+    This is the key to converting nested JSON to CSV format.
+    """
+    return dict(zip(FEATURE_COLUMNS, link_feature_values(LinkFeatures.from_link(link_data))))
+
+def build_feature_frame(rows, columns, bool_columns, count_columns, category_columns):
+    """
+    Build a DataFrame column by column from feature value tuples in columns order,
+    each column in the smallest dtype that holds it: bool for bool_columns, the
+    smallest unsigned int that fits for count_columns, category for category_columns.
+    """
+    values = zip(*rows) if rows else [()] * len(columns)
+    frame_columns = {}
+    for column, column_values in zip(columns, values):
+        if column in bool_columns:
+            frame_columns[column] = np.array(column_values, dtype=bool)
+        elif column in count_columns:
+            frame_columns[column] = pd.to_numeric(np.array(column_values, dtype=np.int64), downcast='unsigned')
+        elif column in category_columns:
+            frame_columns[column] = pd.Categorical(column_values)
+        else:
+            frame_columns[column] = list(column_values)
+    return pd.DataFrame(frame_columns)
+
+def build_link_feature_frame(rows):
+    """DataFrame from link_feature_values rows with the source page appended"""
+    return build_feature_frame(
+        rows, FEATURE_COLUMNS + ['source_page'], BOOL_FEATURE_COLUMNS, COUNT_FEATURE_COLUMNS, CATEGORY_COLUMNS
+    )
 
 def create_training_dataset(json_path, output_csv_path):
     """
     Create a machine learning ready dataset from crawler results.
     """
-    # Load the JSON data
+    # Stream the JSON data one page at a time
     print(f"Loading data from {json_path}")
-    with open(json_path, 'r') as f:
-        crawl_data = json.load(f)
     
     # Process all links
-    all_links = []
-    for source_url, links in crawl_data.items():
+    rows = []
+    for source_url, links in iter_crawl_results(json_path):
         for link in links:
-            # Get flattened features
-            features = flatten_link_features(link)
-            # Add source page for context
-            features['source_page'] = source_url
-            all_links.append(features)
+            # Get flattened features, with the source page for context
+            rows.append(link_feature_values(LinkFeatures.from_link(link)) + (source_url,))
     
     # Convert to DataFrame
-    df = pd.DataFrame(all_links)
-    
+    return finish_training_dataset(build_link_feature_frame(rows), output_csv_path)
+
+def finish_training_dataset(df, output_csv_path):
+    """
+    Label a frame from build_link_feature_frame, save it to CSV and print its statistics.
+    """
     # Create initial labels based on our heuristics
     df['is_good_link'] = (
         # Positive indicators
@@ -95,7 +141,7 @@ def create_training_dataset(json_path, output_csv_path):
     )
     
     # Save to CSV
-    df.to_csv(output_csv_path, index=False)
+    write_dataframe_csv(df, output_csv_path)
     
     # Print dataset statistics
     print("\nDataset Statistics:")
@@ -119,8 +165,11 @@ def create_training_dataset(json_path, output_csv_path):
 if __name__ == "__main__":
     # Set up paths
     results_dir = Path("results")
-    json_path = results_dir / "crawl_results_final.json"
+    # Prefer the Parquet output when the crawl wrote one
+    crawl_results_path = results_dir / "crawl_results_final.parquet"
+    if not crawl_results_path.exists():
+        crawl_results_path = results_dir / "crawl_results_final.json"
     output_csv_path = results_dir / "training_data.csv"
     
     # Create the dataset
-    df = create_training_dataset(json_path, output_csv_path)
\ No newline at end of file
+    df = create_training_dataset(crawl_results_path, output_csv_path)
\ No newline at end of file
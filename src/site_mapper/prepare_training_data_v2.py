@@ -1,124 +1,202 @@
-import json
-import pandas as pd
+import argparse
+import re
+import numpy as np
+from functools import lru_cache
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse
 
-def extract_advanced_features(link_data):
+from site_mapper import prepare_training_data
+from site_mapper.crawl_results import LinkFeatures, iter_crawl_results
+from site_mapper.output_handler import write_dataframe_csv
+from site_mapper.url_parsing import parse_query
+
+# Columns produced by extract_advanced_features, in order
+FEATURE_COLUMNS = [
+    'url', 'link_text', 'is_external',
+    'has_pagination', 'is_main_list_pagination', 'is_nested_pagination',
+    'has_show_param', 'show_param_value', 'is_view_toggle', 'is_detailed_view',
+    'path_depth', 'is_organization_detail', 'is_collection_detail', 'is_main_explore',
+    'num_query_params', 'has_multiple_filters', 'has_sort_and_filter',
+    'position_on_page', 'in_navigation', 'in_main_content',
+    'text_length', 'is_navigation_text', 'is_action_text',
+    'in_faceted_search', 'has_sorting', 'has_filtering', 'potential_issues_count',
+    'leads_to_content', 'is_essential_navigation',
+]
+BOOL_FEATURE_COLUMNS = frozenset({
+    'is_external',
+    'has_pagination', 'is_main_list_pagination', 'is_nested_pagination',
+    'has_show_param', 'is_view_toggle', 'is_detailed_view',
+    'is_organization_detail', 'is_collection_detail', 'is_main_explore',
+    'has_multiple_filters', 'has_sort_and_filter',
+    'in_navigation', 'in_main_content',
+    'is_navigation_text', 'is_action_text',
+    'in_faceted_search', 'has_sorting', 'has_filtering',
+    'leads_to_content', 'is_essential_navigation',
+})
+COUNT_FEATURE_COLUMNS = frozenset({'path_depth', 'num_query_params', 'text_length', 'potential_issues_count'})
+CATEGORY_COLUMNS = frozenset({'url', 'source_page', 'position_on_page', 'show_param_value'})
+
+# Words looked for anywhere in the lowercased link text, so each text is scanned once.
+# No word boundaries: 'pages' or 'preview' count, as they did with substring checks.
+NAVIGATION_WORDS_RE = re.compile('next|previous|page|more')
+ACTION_WORDS_RE = re.compile('view|show|display|browse')
+ESSENTIAL_NAVIGATION_TEXT = frozenset({'home', 'explore', 'browse', 'search'})
+
+# Parent tags that place a link in navigation or in the main content
+NAVIGATION_TAGS = frozenset({'nav', 'header'})
+MAIN_CONTENT_TAGS = frozenset({'main', 'content'})
+
+@lru_cache(maxsize=65536)
+def url_feature_values(url):
     """
-    Extract more nuanced features that capture context, not just simple boolean flags.
-    This will help the ML model learn the edge cases that simple heuristics miss.
+    The features that depend only on a link's URL, computed once for every link
+    to the same URL since nav bars and footers repeat across pages. Returns the
+    pagination through query-complexity features in FEATURE_COLUMNS order, then
+    has_sorting, has_filtering and leads_to_content.
     """
-    analysis = link_data.get('analysis', {})
-    archive_analysis = analysis.get('analyze_archive_it_link', {})
-    
     # Parse URL for detailed analysis
-    parsed_url = urlparse(link_data['absolute_url'])
-    query_params = parse_qs(parsed_url.query)
+    parsed_url = urlparse(url)
+    query_params = parse_query(parsed_url.query)
     path_segments = [seg for seg in parsed_url.path.split('/') if seg]
+    has_page = 'page' in query_params
+    show_value = query_params.get('show', [''])[0]
+    filter_count = sum(1 for key in query_params.keys() if key.startswith('f'))
+    has_sort = 'sort' in query_params
     
-    features = {
-        # Basic features
-        'url': link_data['absolute_url'],
-        'link_text': link_data['text'],
-        'is_external': link_data['is_external'],
-        
+    return (
         # Context-aware pagination features
-        'has_pagination': 'page' in query_params,
-        'is_main_list_pagination': (
-            'page' in query_params and 
+        has_page,
+        (
+            has_page and 
             len(path_segments) <= 2 and  # shallow path = main lists
             'explore' in parsed_url.path
         ),
-        'is_nested_pagination': (
-            'page' in query_params and 
+        (
+            has_page and 
             len(path_segments) > 2  # deep path = might be less important
         ),
         
         # Context-aware show parameters
-        'has_show_param': 'show' in query_params,
-        'show_param_value': query_params.get('show', [''])[0],
-        'is_view_toggle': query_params.get('show', [''])[0] in ['Collections', 'Organizations', 'Sites'],
-        'is_detailed_view': query_params.get('show', [''])[0] in ['full_details', 'expanded'],
+        'show' in query_params,
+        show_value,
+        show_value in ['Collections', 'Organizations', 'Sites'],
+        show_value in ['full_details', 'expanded'],
         
         # Path analysis for content type
-        'path_depth': len(path_segments),
-        'is_organization_detail': 'organizations' in path_segments and len(path_segments) >= 2,
-        'is_collection_detail': 'collections' in path_segments and len(path_segments) >= 2,
-        'is_main_explore': parsed_url.path.strip('/') == 'explore',
+        len(path_segments),
+        'organizations' in path_segments and len(path_segments) >= 2,
+        'collections' in path_segments and len(path_segments) >= 2,
+        parsed_url.path.strip('/') == 'explore',
         
         # Query parameter complexity
-        'num_query_params': len(query_params),
-        'has_multiple_filters': sum(1 for key in query_params.keys() if key.startswith('f')) > 1,
-        'has_sort_and_filter': 'sort' in query_params and any(k.startswith('f') for k in query_params.keys()),
+        len(query_params),
+        filter_count > 1,
+        has_sort and filter_count > 0,
+        
+        # Trap indicators
+        has_sort,
+        filter_count > 0,
+        
+        # Value indicators
+        (
+            ('organizations' in path_segments or 'collections' in path_segments) and
+            len(path_segments) >= 2
+        ),
+    )
+
+def advanced_feature_values(link):
+    """
+    The values of extract_advanced_features for a LinkFeatures, as a tuple in
+    FEATURE_COLUMNS order. Datasets are built from these so no dict is
+    created per link.
+    """
+    parent_elements = link.parent_elements
+    text = link.text
+    lower_text = text.lower()
+    *url_values, has_sorting, has_filtering, leads_to_content = url_feature_values(link.absolute_url)
+    in_navigation = not NAVIGATION_TAGS.isdisjoint(parent_elements)
+    
+    return (
+        # Basic features
+        link.absolute_url,
+        text,
+        link.is_external,
+        
+        # Pagination, show parameter, path and query complexity features
+        *url_values,
         
         # Position and DOM context
-        'position_on_page': analysis.get('link_position', ''),
-        'in_navigation': any(parent in ['nav', 'header'] for parent in analysis.get('parent_elements', [])),
-        'in_main_content': any(parent in ['main', 'content'] for parent in analysis.get('parent_elements', [])),
+        link.link_position,
+        in_navigation,
+        not MAIN_CONTENT_TAGS.isdisjoint(parent_elements),
         
         # Link text analysis
-        'text_length': len(link_data['text']),
-        'is_navigation_text': any(word in link_data['text'].lower() for word in ['next', 'previous', 'page', 'more']),
-        'is_action_text': any(word in link_data['text'].lower() for word in ['view', 'show', 'display', 'browse']),
+        len(text),
+        NAVIGATION_WORDS_RE.search(lower_text) is not None,
+        ACTION_WORDS_RE.search(lower_text) is not None,
         
         # Trap indicators (but more nuanced)
-        'in_faceted_search': archive_analysis.get('in_faceted_search_ui', False),
-        'has_sorting': 'sort' in query_params,
-        'has_filtering': any(key.startswith('f') for key in query_params.keys()),
-        'potential_issues_count': len(archive_analysis.get('potential_issues', [])),
+        link.in_faceted_search,
+        has_sorting,
+        has_filtering,
+        len(link.potential_issues),
         
         # Value indicators
-        'leads_to_content': (
-            ('organizations' in path_segments or 'collections' in path_segments) and
-            len(path_segments) >= 2
-        ),
-        'is_essential_navigation': (
-            link_data['text'].lower() in ['home', 'explore', 'browse', 'search'] or
-            any(parent in ['nav', 'header'] for parent in analysis.get('parent_elements', []))
-        )
-    }
-    
-    return features
+        leads_to_content,
+        lower_text in ESSENTIAL_NAVIGATION_TEXT or in_navigation,
+    )
+
+def extract_advanced_features(link_data):
+    """
+    Extract more nuanced features that capture context, not just simple boolean flags.
+    This will help the ML model learn the edge cases that simple heuristics miss.
+    """
+    return dict(zip(FEATURE_COLUMNS, advanced_feature_values(LinkFeatures.from_link(link_data))))
+
+def build_advanced_feature_frame(rows):
+    """DataFrame from advanced_feature_values rows with the source page appended"""
+    return prepare_training_data.build_feature_frame(
+        rows, FEATURE_COLUMNS + ['source_page'], BOOL_FEATURE_COLUMNS, COUNT_FEATURE_COLUMNS, CATEGORY_COLUMNS
+    )
 
 def create_contextual_labels(df):
     """
     Create more nuanced labels that consider context, not just simple rules.
     """
+    # Work on the underlying numpy arrays, combining masks in place so each
+    # step reuses a buffer instead of allocating a new array
+    has_multiple_filters = df['has_multiple_filters'].to_numpy(dtype=bool)
+    in_faceted_search = df['in_faceted_search'].to_numpy(dtype=bool)
+    not_complex = ~has_multiple_filters
+    
     # Essential pagination should be considered good
-    essential_pagination = (
-        df['is_main_list_pagination'] & 
-        ~df['has_multiple_filters'] &  # Not overly complex
-        (df['text_length'] < 20)  # Simple link text
-    )
+    essential_pagination = df['text_length'].to_numpy() < 20  # Simple link text
+    essential_pagination &= df['is_main_list_pagination'].to_numpy(dtype=bool)
+    essential_pagination &= not_complex  # Not overly complex
     
     # View toggles are sometimes necessary
-    useful_view_toggles = (
-        df['is_view_toggle'] & 
-        df['in_main_content'] &  # In main content area
-        ~df['in_faceted_search']  # Not in sidebar filters
-    )
+    useful_view_toggles = ~in_faceted_search  # Not in sidebar filters
+    useful_view_toggles &= df['is_view_toggle'].to_numpy(dtype=bool)
+    useful_view_toggles &= df['in_main_content'].to_numpy(dtype=bool)  # In main content area
     
     # High-value content pages
-    valuable_content = (
-        df['leads_to_content'] |
-        df['is_essential_navigation'] |
-        (df['is_main_explore'] & ~df['has_multiple_filters'])
-    )
+    valuable_content = df['leads_to_content'].to_numpy(dtype=bool) | df['is_essential_navigation'].to_numpy(dtype=bool)
+    not_complex &= df['is_main_explore'].to_numpy(dtype=bool)
+    valuable_content |= not_complex
     
-    # Clear traps
-    obvious_traps = (
-        df['in_faceted_search'] |
-        df['has_sort_and_filter'] |
-        (df['has_multiple_filters'] & df['has_sorting']) |
-        (df['potential_issues_count'] > 2)
-    )
+    # Clear traps, inverted in place once complete
+    not_trap = df['potential_issues_count'].to_numpy() > 2
+    not_trap |= in_faceted_search
+    not_trap |= df['has_sort_and_filter'].to_numpy(dtype=bool)
+    not_trap |= has_multiple_filters & df['has_sorting'].to_numpy(dtype=bool)
+    np.logical_not(not_trap, out=not_trap)
     
     # Create nuanced labels
-    df['label_simple'] = valuable_content & ~obvious_traps  # Original simple approach
-    df['label_contextual'] = (
-        (valuable_content | essential_pagination | useful_view_toggles) & 
-        ~obvious_traps
-    )
+    df['label_simple'] = valuable_content & not_trap  # Original simple approach
+    valuable_content |= essential_pagination
+    valuable_content |= useful_view_toggles
+    valuable_content &= not_trap
+    df['label_contextual'] = valuable_content
     
     return df
 
@@ -127,25 +205,25 @@ def create_training_dataset_v2(json_path, output_csv_path):
     Create an improved training dataset with contextual features and labels.
     """
     print(f"Loading data from {json_path}")
-    with open(json_path, 'r') as f:
-        crawl_data = json.load(f)
     
-    # Extract features from all links
-    all_links = []
-    for source_url, links in crawl_data.items():
+    # Extract features from all links, streaming the JSON one page at a time
+    rows = []
+    for source_url, links in iter_crawl_results(json_path):
         for link in links:
-            features = extract_advanced_features(link)
-            features['source_page'] = source_url
-            all_links.append(features)
+            rows.append(advanced_feature_values(LinkFeatures.from_link(link)) + (source_url,))
     
     # Convert to DataFrame
-    df = pd.DataFrame(all_links)
-    
+    return finish_training_dataset_v2(build_advanced_feature_frame(rows), output_csv_path)
+
+def finish_training_dataset_v2(df, output_csv_path):
+    """
+    Label a frame from build_advanced_feature_frame, save it to CSV and print the comparison statistics.
+    """
     # Create contextual labels
     df = create_contextual_labels(df)
     
     # Save to CSV
-    df.to_csv(output_csv_path, index=False)
+    write_dataframe_csv(df, output_csv_path)
     
     # Print comparison statistics
     print("\nDataset Statistics:")
@@ -172,9 +250,48 @@ def create_training_dataset_v2(json_path, output_csv_path):
     
     return df
 
+def create_training_datasets(json_path, output_csv_path, output_csv_path_v2):
+    """
+    Create both the original and the improved training datasets from a single
+    pass over the crawler results, returning both DataFrames.
+
+    This saves reading and parsing the crawl twice, not memory: both row lists
+    are held until the first dataset is built, so peak memory is higher than
+    running the two scripts one after the other.
+    """
+    print(f"Loading data from {json_path}")
+    
+    # Extract both feature sets from each link as it is streamed
+    rows = []
+    rows_v2 = []
+    for source_url, links in iter_crawl_results(json_path):
+        for link in links:
+            features = LinkFeatures.from_link(link)
+            rows.append(prepare_training_data.link_feature_values(features) + (source_url,))
+            rows_v2.append(advanced_feature_values(features) + (source_url,))
+    
+    # Finish one dataset before building the other
+    df = prepare_training_data.finish_training_dataset(prepare_training_data.build_link_feature_frame(rows), output_csv_path)
+    del rows
+    df_v2 = finish_training_dataset_v2(build_advanced_feature_frame(rows_v2), output_csv_path_v2)
+    
+    return df, df_v2
+
 if __name__ == "__main__":
     results_dir = Path("results")
-    json_path = results_dir / "crawl_results_final.json"
+    # Prefer the Parquet output when the crawl wrote one
+    crawl_results_path = results_dir / "crawl_results_final.parquet"
+    if not crawl_results_path.exists():
+        crawl_results_path = results_dir / "crawl_results_final.json"
     output_csv_path = results_dir / "training_data_v2.csv"
     
-    df = create_training_dataset_v2(json_path, output_csv_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Create the improved link training dataset')
+    parser.add_argument('--with-original', action='store_true',
+                        help='Also write training_data.csv from the same pass over the crawl results; '
+                             'faster than running prepare_training_data as well, but uses more memory')
+    args = parser.parse_args()
+    
+    if args.with_original:
+        df, df_v2 = create_training_datasets(crawl_results_path, results_dir / "training_data.csv", output_csv_path)
+    else:
+        df = create_training_dataset_v2(crawl_results_path, output_csv_path)
\ No newline at end of file
@@ -0,0 +1,15 @@
+import re
+from urllib.parse import parse_qs
+
+# One name=value pair of a query string; pairs without '=' or with an empty value
+# never match, which is what parse_qs does with them by default
+QUERY_PARAM_RE = re.compile(r'(?:^|&)([^&=]*)=([^&]+)')
+
+def parse_query(query: str) -> dict[str, list[str]]:
+    """parse_qs equivalent that skips the percent/plus decoding when there is nothing to decode"""
+    if '%' in query or '+' in query:
+        return parse_qs(query)
+    params = {}
+    for name, value in QUERY_PARAM_RE.findall(query):
+        params.setdefault(name, []).append(value)
+    return params